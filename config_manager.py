@@ -1,35 +1,46 @@
+import functools
 import os
 import json
 import sys
+from types import MappingProxyType
 
-from traits.trait_types import true
+# 已解析配置的进程内缓存: {配置路径: ((st_mtime_ns, st_size), 配置dict)}
+# 批量处理时每个文件都会调用 load_config()，缓存可省去重复的磁盘IO和JSON解析
+_CONFIG_CACHE = {}
 
-DEFAULT_CONFIG = {
-    "document_settings": {
+# 只读的默认配置：防止调用方改动返回的dict时悄悄改写模块级默认值
+DEFAULT_CONFIG = MappingProxyType({
+    "document_settings": MappingProxyType({
         "max_length": 1000,
         "min_length": 300,
         "sentence_integrity_weight": 8.0,
         "table_length_factor": 1.2
-    },
-    "processing_options": {
+    }),
+    "processing_options": MappingProxyType({
         "debug_mode": False,
         "output_folder": "输出文件夹",
         "skip_existing": True
-    },
-    "advanced_settings": {
+    }),
+    "advanced_settings": MappingProxyType({
         "min_split_score": 7,
         "heading_score_bonus": 10,
         "sentence_end_score_bonus": 6,
         "length_score_factor": 100,
         "search_window": 5,
         "heading_after_penalty": 12,
-        "force_split_before_heading": true
-    }
-}
+        "force_split_before_heading": True
+    })
+})
 
 
+def get_default_config():
+    """返回默认配置的可变浅工作副本"""
+    return {section: dict(settings) for section, settings in DEFAULT_CONFIG.items()}
+
+
+@functools.lru_cache(maxsize=1)
 def get_config_path():
-    """获取配置文件路径"""
+    """获取配置文件路径（结果缓存，整个进程只算一次）"""
     # 获取脚本当前路径
     current_dir = os.path.dirname(os.path.abspath(sys.argv[0]))
     if not current_dir:  # 如果为空，使用当前工作目录
@@ -38,34 +49,52 @@ def get_config_path():
     return os.path.join(current_dir, "config.json")
 
 
+def _merge_defaults(user_cfg):
+    """用默认值补全用户配置，每节一次dict合并，避免逐键的嵌套循环"""
+    merged = dict(user_cfg)
+    for section, settings in DEFAULT_CONFIG.items():
+        merged[section] = {**settings, **user_cfg.get(section, {})}
+    return merged
+
+
+def invalidate_config_cache():
+    """清空配置缓存，配置被写回后调用"""
+    _CONFIG_CACHE.clear()
+
+
 def load_config():
-    """加载配置，如果配置文件不存在则创建默认配置"""
+    """加载配置，如果配置文件不存在则创建默认配置
+
+    解析结果按 (路径, mtime_ns) 缓存，文件未变化时直接返回缓存的dict。
+    """
     config_path = get_config_path()
 
     if not os.path.exists(config_path):
+        config = get_default_config()
         with open(config_path, 'w', encoding='utf-8') as f:
-            json.dump(DEFAULT_CONFIG, f, ensure_ascii=False, indent=2)
+            json.dump(config, f, ensure_ascii=False, indent=2)
         print(f"已创建默认配置文件: {config_path}")
-        return DEFAULT_CONFIG
+        return config
 
     try:
+        st = os.stat(config_path)
+        stamp = (st.st_mtime_ns, st.st_size)
+        cached = _CONFIG_CACHE.get(config_path)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+
         with open(config_path, 'r', encoding='utf-8') as f:
             config = json.load(f)
 
         # 检查配置完整性，补充缺失的默认值
-        for section, settings in DEFAULT_CONFIG.items():
-            if section not in config:
-                config[section] = settings
-            else:
-                for key, value in settings.items():
-                    if key not in config[section]:
-                        config[section][key] = value
+        config = _merge_defaults(config)
 
+        _CONFIG_CACHE[config_path] = (stamp, config)
         return config
     except Exception as e:
         print(f"加载配置文件时出错: {str(e)}")
         print("使用默认配置")
-        return DEFAULT_CONFIG
+        return get_default_config()
 
 
 def save_config(config):
@@ -75,6 +104,7 @@ def save_config(config):
     try:
         with open(config_path, 'w', encoding='utf-8') as f:
             json.dump(config, f, ensure_ascii=False, indent=2)
+        invalidate_config_cache()
         return True
     except Exception as e:
         print(f"保存配置文件时出错: {str(e)}")
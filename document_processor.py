@@ -8,13 +8,32 @@
 
 from docx import Document
 from text_analysis import extract_elements_info
+import logging
 import os
+from itertools import accumulate
 from text_analysis import (
+    ElemType,
     is_sentence_boundary,
     find_nearest_sentence_boundary
 )
-from docx.oxml.text.paragraph import CT_P
-from docx.oxml.table import CT_Tbl
+from docx.oxml import OxmlElement
+from docx.oxml.ns import qn
+
+__all__ = ["insert_split_markers"]
+
+# 可选的 Numba JIT 快速路径：分割扫描已是纯数值循环，装有 numba 时编译执行
+try:
+    import numpy as _np
+    from numba import njit as _njit
+    _HAVE_NUMBA = True
+except ImportError:
+    _HAVE_NUMBA = False
+
+# body 子元素的限定标签名，供 lxml 的 C 级 iterchildren 过滤
+_P_TAG = qn('w:p')
+_TBL_TAG = qn('w:tbl')
+
+logger = logging.getLogger(__name__)
 
 
 def insert_split_markers(input_file, output_file, config):
@@ -44,32 +63,31 @@ def insert_split_markers(input_file, output_file, config):
     length_score_factor = adv_settings["length_score_factor"]
 
     if debug_mode:
-        print(f"正在处理文档: {input_file}")
+        logging.basicConfig(level=logging.DEBUG, format="%(message)s")
 
-    # 如果配置为跳过已存在文件，且输出文件已存在，则跳过处理
-    if proc_options["skip_existing"] and os.path.exists(output_file):
-        if debug_mode:
-            print(f"跳过已存在文件: {output_file}")
+    # 如果配置为跳过已存在文件，且输出文件不旧于输入文件，则跳过处理
+    # （任何解析/分析工作之前先判断，重跑时省掉整个 docx 解压+解析）
+    if proc_options["skip_existing"] and os.path.exists(output_file) \
+            and os.path.getmtime(output_file) >= os.path.getmtime(input_file):
+        logger.debug("跳过已存在文件: %s", output_file)
         return True
 
+    logger.debug("正在处理文档: %s", input_file)
+
     try:
         doc = Document(input_file)
     except Exception as e:
         print(f"无法打开文档 {input_file}: {str(e)}")
         return False
 
-    # 创建新文档
-    new_doc = Document()
-
     # 统一提取段落 + 表格
     table_factor = config.get("document_settings", {}).get("table_length_factor", 1.0)
     elements_info = extract_elements_info(doc, table_factor, debug_mode)
 
-    if debug_mode:
-        print(f"文档共有 {len(elements_info)} 个元素（段落 + 表格）")
+    logger.debug("文档共有 %d 个元素（段落 + 表格）", len(elements_info))
 
-    # 确定分隔点
-    split_points = find_split_points(
+    # 确定分隔点（附带相邻元素句界位图，供后处理复用）
+    split_points, boundary = find_split_points(
         elements_info,
         max_length, min_length,
         sentence_integrity_weight, search_window,
@@ -80,18 +98,16 @@ def insert_split_markers(input_file, output_file, config):
 
     # 后处理：检查所有分割点确保不会打断句子
     final_split_points = refine_split_points(
-        elements_info, split_points, search_window, debug_mode
+        elements_info, split_points, search_window, debug_mode, boundary
     )
 
     final_split_points = merge_heading_with_body(elements_info, final_split_points)
 
-    if debug_mode:
-        print(f"最终分割点: {final_split_points}")
+    logger.debug("最终分割点: %s", final_split_points)
 
-    # 创建带有分隔符的新文档
+    # 在原文档树中就地插入分隔符后写出
     result = create_output_document(
         doc,
-        new_doc,
         final_split_points,
         output_file,
         debug_mode
@@ -107,226 +123,278 @@ def find_split_points(elements_info, max_length, min_length,
                       sentence_end_score_bonus, length_score_factor,
                       debug_mode, adv_settings):
     force_heading = adv_settings.get("force_split_before_heading", True)
+
+    # AoS -> SoA: 热循环里用列表下标代替逐字段的dict取值
+    lengths = [e.length for e in elements_info]
+    types = [e.type for e in elements_info]
+    texts = [e.text for e in elements_info]
+    headings = [e.is_heading for e in elements_info]
+    ends_period = [e.ends_with_period for e in elements_info]
+
+    # 前缀和: cum[i] = lengths[0..i] 之和
+    # 当前段长 = cum[idx] - base，分段时只需把 base 推到 cum[idx]
+    cum = list(accumulate(lengths))
+
+    # 相邻元素间的句界位图：评分、扫描和后处理共用这一份
+    n = len(elements_info)
+    boundary = [False] * n
+    for i in range(1, n):
+        # 前段以句末标点收尾的必然是句界，免去正则/缓存查询
+        boundary[i] = ends_period[i-1] or is_sentence_boundary(texts[i-1], texts[i])
+
+    # 每个元素与循环状态无关的得分项只算一次
+    static_scores = calculate_static_scores(
+        lengths, types, headings, ends_period, boundary,
+        sentence_integrity_weight, heading_score_bonus,
+        sentence_end_score_bonus, adv_settings
+    )
+
+    if _HAVE_NUMBA and not debug_mode:
+        points = _scan_split_points_jit(
+            _np.asarray(lengths, _np.int64),
+            _np.asarray(cum, _np.int64),
+            _np.asarray(static_scores, _np.float64),
+            _np.asarray(headings, _np.bool_),
+            _np.asarray(boundary, _np.bool_),
+            bool(force_heading), min_length, max_length,
+            length_score_factor, min_split_score, search_window
+        )
+        return [int(p) for p in points], boundary
+
     split_points = []
-    current_length = 0
+    base = 0
     last_potential = -1
 
-    for idx, elem in enumerate(elements_info):
-        if force_heading and elem['is_heading'] and idx > 0:
+    for idx in range(len(elements_info)):
+        if force_heading and headings[idx] and idx > 0:
             # 只有当上一分段点不是自己才加入
             if not split_points or idx != split_points[-1]:
                 split_points.append(idx)
-            current_length = 0
+            base = cum[idx]
             last_potential = idx
             if debug_mode:
-                preview = (elem['text'][:30] + '...') if elem['text'] else '[table]'
-                print(f"  #{idx:03d} (heading) 强制分段 «{preview}»")
+                logger.debug("  #%03d (heading) 强制分段 «%.30s»",
+                             idx, texts[idx] or '[table]')
             continue
 
-        if elem['length'] == 0:
+        if lengths[idx] == 0:
             continue
 
-        current_length += elem['length']
-        score = calculate_split_score(
-            idx, elem, elements_info, current_length,
-            min_length, max_length, sentence_integrity_weight,
-            heading_score_bonus, sentence_end_score_bonus,
-            length_score_factor, split_points,
-            adv_settings
-        )
+        current_length = cum[idx] - base
+
+        # 静态部分查表 + 仅与运行状态相关的长度/距离项
+        score = static_scores[idx]
+        if current_length >= min_length:
+            score += min(4, (current_length - min_length)//length_score_factor)
+        elif current_length < min_length*0.7:
+            score -= 5
+        if split_points and idx - split_points[-1] < 3:
+            score -= 8
+        if current_length > max_length:
+            score += 4
 
         if debug_mode:
-            preview = (elem['text'][:30] + '...') if elem['text'] else '[table]'
-            print(f"  #{idx:03d} ({elem['type']}) len={elem['length']} score={score:.1f} {preview}")
+            logger.debug("  #%03d (%s) len=%d score=%.1f %.30s",
+                         idx, 'para' if types[idx] == ElemType.PARA else 'table',
+                         lengths[idx], score, texts[idx] or '[table]')
 
         if score >= min_split_score and idx > 0:
             split_points.append(idx)
-            current_length = 0
+            base = cum[idx]
             last_potential = idx
         elif current_length > max_length * 1.5:
-            best = find_nearest_sentence_boundary(elements_info, idx, search_window)
+            best = find_nearest_sentence_boundary(elements_info, idx, search_window,
+                                                  boundary)
             if best >= 0 and (not split_points or best > split_points[-1]):
                 split_points.append(best)
-                current_length = 0
+                base = cum[idx]
                 last_potential = best
             elif idx - last_potential > 3:
                 split_points.append(idx)
-                current_length = 0
+                base = cum[idx]
                 last_potential = idx
 
-    return split_points
-
-
-def calculate_split_score(idx, elem, elements_info, current_length,
-                          min_length, max_length, sentence_integrity_weight,
-                          heading_score_bonus, sentence_end_score_bonus,
-                          length_score_factor, split_points, adv_settings):
-    score = 0
-    if elem['type'] == 'para':
-        if elem['is_heading']:
-            score += heading_score_bonus
-        if elem['ends_with_period']:
-            score += sentence_end_score_bonus
-        # 句子边界检查（仅段落间）
-        if idx > 0 and elements_info[idx-1]['type'] == 'para' and \
-           is_sentence_boundary(elements_info[idx-1]['text'], elem['text']):
-            score += sentence_integrity_weight
+    return split_points, boundary
+
+
+def calculate_static_scores(lengths, types, headings, ends_period, boundary,
+                            sentence_integrity_weight, heading_score_bonus,
+                            sentence_end_score_bonus, adv_settings):
+    """预计算每个元素与扫描状态无关的得分项
+
+    标题/句末加分、句子边界判定和"标题后首段"惩罚只取决于元素本身
+    及其前邻，与当前段长、已选分割点无关，整个文档算一遍即可。
+    剩下的长度因子和距离惩罚留在扫描循环里。
+    """
+    heading_after_penalty = adv_settings.get("heading_after_penalty", 12)
+    scores = [0.0] * len(lengths)
+
+    for idx in range(len(lengths)):
+        if lengths[idx] == 0:
+            continue
+        score = 0
+        if types[idx] == ElemType.PARA:
+            if headings[idx]:
+                score += heading_score_bonus
+            if ends_period[idx]:
+                score += sentence_end_score_bonus
+            # 句子边界检查（仅段落间）
+            if idx > 0 and types[idx-1] == ElemType.PARA and boundary[idx]:
+                score += sentence_integrity_weight
+            else:
+                score -= 10
+            # ---- 标题之后(允许夹空段)的第一段，强行减分 ----
+            prev = idx - 1
+            while prev >= 0 and types[prev] == ElemType.PARA \
+                    and lengths[prev] == 0:  # 跳过空段
+                prev -= 1
+            if prev >= 0 and headings[prev]:
+                score -= heading_after_penalty  # 让评分掉到阈值以下
         else:
-            score -= 10
-        # ---- 标题之后(允许夹空段)的第一段，强行减分 ----
-        prev = idx - 1
-        while prev >= 0 and elements_info[prev]['type'] == 'para' \
-                and elements_info[prev]['length'] == 0:  # 跳过空段
-            prev -= 1
-        if prev >= 0 and elements_info[prev]['is_heading']:
-            heading_after_penalty = adv_settings.get("heading_after_penalty", 12)
-            score -= heading_after_penalty  # 让评分掉到阈值以下
-    else:
-        # 表格：天然边界，可在其前后分段
-        score += 6
-
-    # 长度因子
-    if current_length >= min_length:
-        score += min(4, (current_length - min_length)//length_score_factor)
-    elif current_length < min_length*0.7:
-        score -= 5
-
-    # 避免过近
-    if split_points and idx - split_points[-1] < 3:
-        score -= 8
-    if current_length > max_length:
-        score += 4
-    return score
-
-
-def refine_split_points(elements_info, split_points, search_window, debug_mode):
+            # 表格：天然边界，可在其前后分段
+            score += 6
+        scores[idx] = score
+
+    return scores
+
+
+if _HAVE_NUMBA:
+    @_njit(cache=True)
+    def _scan_split_points_jit(lengths, cum, static_scores, headings, boundary,
+                               force_heading, min_length, max_length,
+                               length_score_factor, min_split_score,
+                               search_window):
+        """find_split_points 扫描循环的编译版本，语义与纯 Python 路径一致"""
+        n = lengths.shape[0]
+        out = _np.empty(n, _np.int64)
+        cnt = 0
+        base = 0
+        last_potential = -1
+
+        for idx in range(n):
+            if force_heading and headings[idx] and idx > 0:
+                if cnt == 0 or out[cnt - 1] != idx:
+                    out[cnt] = idx
+                    cnt += 1
+                base = cum[idx]
+                last_potential = idx
+                continue
+
+            if lengths[idx] == 0:
+                continue
+
+            current_length = cum[idx] - base
+            score = static_scores[idx]
+            if current_length >= min_length:
+                bonus = (current_length - min_length) // length_score_factor
+                score += 4 if bonus > 4 else bonus
+            elif current_length < min_length * 0.7:
+                score -= 5
+            if cnt > 0 and idx - out[cnt - 1] < 3:
+                score -= 8
+            if current_length > max_length:
+                score += 4
+
+            if score >= min_split_score and idx > 0:
+                out[cnt] = idx
+                cnt += 1
+                base = cum[idx]
+                last_potential = idx
+            elif current_length > max_length * 1.5:
+                # 在±search_window窗口内查最近句界（同 find_nearest_sentence_boundary）
+                best = -1
+                min_dist = n + 1
+                lo = idx - search_window
+                if lo < 1:
+                    lo = 1
+                for i in range(lo, idx + 1):
+                    if boundary[i] and idx - i < min_dist:
+                        min_dist = idx - i
+                        best = i
+                hi = idx + search_window + 1
+                if hi > n:
+                    hi = n
+                for i in range(idx + 1, hi):
+                    if boundary[i] and i - idx < min_dist:
+                        min_dist = i - idx
+                        best = i
+
+                if best >= 0 and (cnt == 0 or best > out[cnt - 1]):
+                    out[cnt] = best
+                    cnt += 1
+                    base = cum[idx]
+                    last_potential = best
+                elif idx - last_potential > 3:
+                    out[cnt] = idx
+                    cnt += 1
+                    base = cum[idx]
+                    last_potential = idx
+
+        return out[:cnt]
+
+
+def refine_split_points(elements_info, split_points, search_window, debug_mode,
+                        boundary):
     refined = []
     for sp in split_points:
-        before = elements_info[sp-1]['text'] if sp>0 else ''
-        after  = elements_info[sp]['text']
-        if elements_info[sp-1]['type']=='para' and elements_info[sp]['type']=='para' and \
-           not is_sentence_boundary(before, after):
-            best = find_nearest_sentence_boundary(elements_info, sp, search_window)
+        if elements_info[sp-1].type==ElemType.PARA and elements_info[sp].type==ElemType.PARA and \
+           not boundary[sp]:
+            best = find_nearest_sentence_boundary(elements_info, sp, search_window,
+                                                  boundary)
             refined.append(best if best>=0 else sp)
         else:
             refined.append(sp)
     return sorted(set(refined))
 
 def merge_heading_with_body(elements_info, split_points):
-    adjusted = []
+    adjusted = set()  # 集合去重，成员判断O(1)
     for sp in split_points:
         new_sp = sp
         # 向前扫，跳过空段落
-        while new_sp > 0 and elements_info[new_sp-1]['type'] == 'para' \
-              and elements_info[new_sp-1]['length'] == 0:
+        while new_sp > 0 and elements_info[new_sp-1].type == ElemType.PARA \
+              and elements_info[new_sp-1].length == 0:
             new_sp -= 1
         # （2）如果刚跳到的就是标题 —— OK，保持 new_sp
-        if elements_info[new_sp]['is_heading']:
+        if elements_info[new_sp].is_heading:
             pass
         # （3）如果它的前一个元素是标题，则把分割点移到标题
-        elif new_sp > 0 and elements_info[new_sp - 1]['is_heading']:
+        elif new_sp > 0 and elements_info[new_sp - 1].is_heading:
             new_sp -= 1
-        if new_sp not in adjusted:
-            adjusted.append(new_sp)
+        adjusted.add(new_sp)
     return sorted(adjusted)
 
 
 
 
-def copy_single_table(table, new_doc, debug_mode):
-    """复制单个表格"""
-    if table is None:  # ← 兜底
-        return
-    try:
-        rows = len(table.rows)
-        cols = len(table.rows[0].cells) if rows > 0 else 0
-
-        if rows > 0 and cols > 0:
-            new_table = new_doc.add_table(rows=rows, cols=cols)
-
-            try:
-                new_table.style = table.style
-            except:
-                pass
-
-            for i, row in enumerate(table.rows):
-                for j, cell in enumerate(row.cells):
-                    if i < len(new_table.rows) and j < len(new_table.rows[i].cells):
-                        try:
-                            new_cell = new_table.rows[i].cells[j]
-                            if cell.text:
-                                new_cell.text = cell.text
-                        except:
-                            pass
-    except Exception as e:
-        if debug_mode:
-            print(f"  警告: 处理表格时出错: {str(e)}")
+def _make_split_marker_paragraph():
+    """构造承载 <!--split--> 标记文本的 <w:p> 元素"""
+    p = OxmlElement('w:p')
+    r = OxmlElement('w:r')
+    t = OxmlElement('w:t')
+    t.text = "<!--split-->"
+    r.append(t)
+    p.append(r)
+    return p
+
 
+def create_output_document(doc, split_points, output_file, debug_mode):
+    """在已解析的文档树中就地插入分隔标记并保存
 
-def create_output_document(doc, new_doc, split_points, output_file, debug_mode):
+    直接向原树 addprevious 标记段落，原有段落/表格的全部格式、
+    页眉页脚、样式表原样保留，也省去了重建第二棵 DOM 的开销。
+    """
     split_marker_cnt = 0
-    para_iter = iter(doc.paragraphs)
-    tbl_iter  = iter(doc.tables)
-    next_para = next(para_iter, None)
-    next_tbl  = next(tbl_iter, None)
-    idx = -1
-
-    # 将 Word DOM 再次顺序遍历
-    for el in doc._element.body:
-        idx += 1
-        if idx in split_points:
-            new_doc.add_paragraph("<!--split-->")
-            split_marker_cnt += 1
+    # 与 elements_info 的编号对齐：只数段落和表格
+    targets = list(doc._element.body.iterchildren(_P_TAG, _TBL_TAG))
 
-        if isinstance(el, CT_P):
-            # —— 段落 ——
-            copy_paragraph(next_para, new_doc, debug_mode)
-            next_para = next(para_iter, None)
-        elif isinstance(el, CT_Tbl):
-            # —— 表格 ——
-            copy_single_table(next_tbl, new_doc, debug_mode)
-            next_tbl = next(tbl_iter, None)
+    for sp in split_points:
+        if 0 <= sp < len(targets):
+            targets[sp].addprevious(_make_split_marker_paragraph())
+            split_marker_cnt += 1
 
     # 保存
     os.makedirs(os.path.dirname(output_file), exist_ok=True)
-    new_doc.save(output_file)
-    if debug_mode:
-        print(f"✓ 保存: {output_file} (split={split_marker_cnt})")
+    doc.save(output_file)
+    logger.debug("✓ 保存: %s (split=%d)", output_file, split_marker_cnt)
     return True
 
-
-
-def copy_paragraph(src_para, new_doc, debug_mode):
-    """复制段落内容和格式"""
-    text = src_para.text
-    new_para = new_doc.add_paragraph(text)
-
-    # 复制格式
-    try:
-        if src_para.style:
-            new_para.style = src_para.style
-        new_para.alignment = src_para.alignment
-
-        # 复制段落内的文本格式
-        for j in range(min(len(src_para.runs), len(new_para.runs))):
-            src_run = src_para.runs[j]
-            dst_run = new_para.runs[j]
-
-            for attr in ['bold', 'italic', 'underline']:
-                if hasattr(src_run, attr):
-                    setattr(dst_run, attr, getattr(src_run, attr))
-
-            # 复制字体属性
-            if hasattr(src_run, 'font') and hasattr(dst_run, 'font'):
-                for attr in ['size', 'name', 'color']:
-                    try:
-                        if hasattr(src_run.font, attr):
-                            src_value = getattr(src_run.font, attr)
-                            if src_value:
-                                setattr(dst_run.font, attr, src_value)
-                    except:
-                        pass
-    except Exception as e:
-        if debug_mode:
-            print(f"  警告: 复制格式时出错: {str(e)}")
-
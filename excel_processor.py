@@ -1,23 +1,40 @@
+import os
 import sys
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from html import escape
 from io import BytesIO
 from pathlib import Path
 from typing import List
 
+import numpy as np
 import pandas as pd
 import xlrd
-from bs4 import BeautifulSoup
 from openpyxl import load_workbook
 from openpyxl.utils import range_boundaries
 
+# 可选依赖：python-calamine（Rust实现的Excel解析器），装了就优先用于数据读取
+try:
+    from python_calamine import CalamineWorkbook
+    _HAVE_CALAMINE = True
+except ImportError:
+    _HAVE_CALAMINE = False
+
 
 def is_empty_sheet_openpyxl(ws):
     """
     ws: openpyxl sheet
     """
-    for row in ws.iter_rows(min_row=1, max_row=100):
-        for cell in row:
-            if cell.value not in [None, "", " "]:
-                return False
+    # 快速路径：维度信息显示只有A1一格时，直接判断该格取值
+    if ws.max_row <= 1 and ws.max_column <= 1:
+        if ws.cell(1, 1).value not in (None, "", " "):
+            return False
+    else:
+        # values_only按行返回标量元组，省去逐格构建Cell对象的分配开销
+        if any(v not in (None, "", " ")
+               for row in ws.iter_rows(min_row=1, max_row=100, values_only=True)
+               for v in row):
+            return False
     # print(ws.merged_cells.ranges, ws.page_setup.orientation, ws.print_area)
     if any([
         len(ws.merged_cells.ranges) > 0,
@@ -38,15 +55,49 @@ def is_empty_sheet_xlrd(ws):
     return False
 
 
+def is_all_empty(df):
+    """向量化判断是否所有单元格为空（None/NaN或纯空白字符串）"""
+    arr = df.to_numpy(copy=False)
+    if arr.size == 0:
+        return True
+    na_mask = pd.isna(arr)
+    if na_mask.all():
+        return True
+    return not np.char.str_len(np.char.strip(arr[~na_mask].astype('U'))).any()
+
+
+def _parse_sheet_openpyxl(args):
+    """进程池worker：每个子进程独立打开workbook，只解析指定的sheet"""
+    file_data, sheet_name, output_format, nrows, usecols = args
+    return ExcelParser.parse_openpyxl(file_data, verbose=False, output_format=output_format,
+                                      nrows=nrows, usecols=usecols, only_sheet=sheet_name)
+
+
+def to_markdown_table(df):
+    """直接拼接GFM管道表格
+
+    df.to_markdown()走tabulate，要逐格测宽做对齐；给LLM用的表格不需要
+    对齐填充，单次join即可。单元格在此处惰性转字符串，空值输出为空。
+    """
+    ncols = df.shape[1]
+    lines = ['|' + '|'.join(str(c) for c in df.columns) + '|',
+             '|---' * ncols + '|']
+    lines.extend('|' + '|'.join('' if v is None or v != v else str(v) for v in row) + '|'
+                 for row in df.to_numpy(copy=False).tolist())
+    return '\n'.join(lines)
+
+
 class ExcelParser:
     """
     解析excel文件，支持.xls、.xlsx格式，填充合并单元格，将每个sheet转换成markdown格式的table 便于llm使用
     支持.csv
     """
 
-    def parse(self, input_data: str | Path | bytes | BytesIO, verbose=True, output_format='markdown') -> List[str]:
+    def parse(self, input_data: str | Path | bytes | BytesIO, verbose=True, output_format='markdown',
+              nrows=None, usecols=None) -> List[str]:
         """
         支持文件路径,Path,文件的bytes以及BytesIO
+        nrows/usecols用于采样预览：只读前nrows行/指定列，省去整表解析
         """
         if isinstance(input_data, (str, Path)):
             path = Path(input_data)
@@ -76,121 +127,191 @@ class ExcelParser:
         if parser is None:
             raise ValueError(error_message)
         try:
-            parse_res = parser(file_bytes, verbose=verbose, output_format=output_format)
+            parse_res = parser(file_bytes, verbose=verbose, output_format=output_format,
+                               nrows=nrows, usecols=usecols)
         except error_type as e:
             raise ValueError(error_message) from e
         return parse_res
 
     @staticmethod
-    def parse_openpyxl(file_data: bytes, verbose=True, output_format='markdown') -> List[str]:
+    def parse_openpyxl(file_data: bytes, verbose=True, output_format='markdown',
+                       nrows=None, usecols=None, only_sheet=None, parallel=False) -> List[str]:
         """
         将表格解析转换成markdown格式,只支持xlsx格式
+        parallel=True时多sheet工作簿按sheet分发到进程池并行解析
         """
-        if not isinstance(file_data, bytes):
-            raise ValueError("file_data must be bytes")
+        if usecols is not None and output_format != 'markdown':
+            raise ValueError("usecols 只支持 markdown 输出（HTML合并跨度按原始列号计算）")
+
+        if parallel and only_sheet is None:
+            # read_only打开几乎无成本，先探一下sheet数量再决定是否并行
+            wb_probe = load_workbook(BytesIO(file_data), read_only=True)
+            sheet_names = wb_probe.sheetnames
+            wb_probe.close()
+            if len(sheet_names) > 1:
+                tasks = [(file_data, name, output_format, nrows, usecols) for name in sheet_names]
+                workers = min(len(sheet_names), os.cpu_count() or 1)
+                result = []
+                with ProcessPoolExecutor(max_workers=workers) as pool:
+                    for sheet_result in pool.map(_parse_sheet_openpyxl, tasks):
+                        result.extend(sheet_result)
+                return result
         file_bio = BytesIO(file_data)
-        wb = load_workbook(file_bio, data_only=True)
+        # 先在ZIP层面直查worksheet XML里有没有<mergeCell，决定是否需要加载普通模式workbook
+        with zipfile.ZipFile(file_bio) as zf:
+            has_merges = any(
+                name.startswith('xl/worksheets/') and b'<mergeCell' in zf.read(name)
+                for name in zf.namelist())
+        file_bio.seek(0)
+        if _HAVE_CALAMINE:
+            # 数据读取走calamine（Rust解析，远快于openpyxl）；合并信息仍由openpyxl提供
+            wb_cal = CalamineWorkbook.from_filelike(file_bio)
+            wb = None
+            all_sheet_names = wb_cal.sheet_names
+        else:
+            # read_only模式按行流式读取，避免普通模式逐单元格构建Cell对象的内存开销
+            wb_cal = None
+            wb = load_workbook(file_bio, data_only=True, read_only=True)
+            all_sheet_names = wb.sheetnames
+        # 只有存在合并单元格时才额外加载一份普通模式workbook取合并信息
+        # （read_only工作簿按sheet惰性读file_bio，不能与它共用同一个流）
+        wb_meta = load_workbook(BytesIO(file_data), data_only=True) if has_merges else None
         result = []
-        with pd.ExcelFile(file_bio) as xls:
-            for sheet_name in xls.sheet_names:
-                # 获取当前sheet的合并单元格信息
-                ws = wb[sheet_name]
-
-                if is_empty_sheet_openpyxl(ws):
-                    if verbose:
-                        print(f"跳过空工作表: {sheet_name}", file=sys.stderr)
-                    continue
+        for sheet_name in ([only_sheet] if only_sheet is not None else all_sheet_names):
+            cal_rows = None
+            if wb_cal is not None:
+                cal_rows = wb_cal.get_sheet_by_name(sheet_name).to_python()
+                if nrows is not None:
+                    cal_rows = cal_rows[:nrows]
+            ws_data = wb[sheet_name] if wb is not None else None
+            # 获取当前sheet的合并单元格信息（无合并单元格时无需普通模式worksheet）
+            ws = wb_meta[sheet_name] if wb_meta is not None else None
+
+            if ws is not None:
+                is_empty = is_empty_sheet_openpyxl(ws)
+            elif cal_rows is not None:
+                is_empty = not any(v not in (None, '', ' ') for row in cal_rows for v in row)
+            else:
+                # 无合并单元格：流式扫描取值判断是否为空表
+                is_empty = not any(
+                    v not in (None, '', ' ')
+                    for row in ws_data.iter_rows(values_only=True)
+                    for v in row)
+            if is_empty:
+                if verbose:
+                    print(f"跳过空工作表: {sheet_name}", file=sys.stderr)
+                continue
 
-                merge_map = {}  # 记录合并单元格value
-                merge_cell = {}  # 记录被合并单元格坐标
-                merge_info = {}  # 记录合并单元格起始位置以及跨度
-                # 构建合并单元格值映射表
+            merge_info = {}  # 记录合并单元格起始位置以及跨度（仅HTML输出需要）
+            merges = []  # (min_row, min_col, max_row, max_col, 主值)，用于numpy切片填充
+            html_mode = output_format != 'markdown'
+            # 构建合并单元格信息
+            if ws is not None:
                 for merge_range in ws.merged_cells.ranges:
                     min_col, min_row, max_col, max_row = range_boundaries(merge_range.coord)
                     master_value = ws.cell(min_row, min_col).value
+                    merges.append((min_row, min_col, max_row, max_col, master_value))
+                    if not html_mode:
+                        continue  # markdown只需填值，不用跨度信息
                     merge_info[(min_row, min_col)] = (
                         max_row - min_row + 1,
                         max_col - min_col + 1
                     )
-                    # 为合并区域所有单元格记录主值
-                    for row in range(min_row, max_row + 1):
-                        for col in range(min_col, max_col + 1):
-                            merge_map[(row, col)] = master_value
-                            if (row, col) != (min_row, min_col):
-                                merge_cell[(row, col)] = True  # 记录被合并的单元格
-
-                try:
-                    df = pd.read_excel(xls, sheet_name=sheet_name, header=None).astype(str)
-                except Exception as e:
-                    print(f"读取工作表 {sheet_name} 失败: {str(e)}", file=sys.stderr)
-                    continue
 
-                # 有效性验证（防止全空数据）
-                if df.map(lambda x: x.strip() if isinstance(x, str) else '').eq('').all().all():
+            try:
+                if cal_rows is not None:
+                    rows = cal_rows
+                else:
+                    # 直接复用已加载的worksheet，避免pd.ExcelFile对同一份字节流二次解析
+                    # nrows下推到iter_rows，采样时不再解析整个sheet
+                    rows = list(ws_data.iter_rows(max_row=nrows, values_only=True))
+                # 保留原始dtype，转字符串推迟到渲染时逐格进行
+                df = pd.DataFrame(rows, dtype=object)
+            except Exception as e:
+                print(f"读取工作表 {sheet_name} 失败: {str(e)}", file=sys.stderr)
+                continue
+
+            # 有效性验证（防止全空数据）
+            if is_all_empty(df):
+                if verbose:
+                    print(f"跳过无效数据工作表: {sheet_name}", file=sys.stderr)
+                continue
+
+            # 应用合并单元格值覆盖：numpy切片一次填满整个区域，替代逐单元格iat写入。
+            # 注意要在自有的数组副本上填，再由它重建DataFrame：
+            # copy=False的视图在pandas开启写时复制(CoW)后是只读的
+            if merges:
+                arr = df.to_numpy(copy=True)
+                n_rows, n_cols = arr.shape
+                for min_row, min_col, max_row, max_col, value in merges:
+                    # pandas的行号从0开始，openpyxl从1开始；min()防止越界
+                    arr[min_row - 1:min(max_row, n_rows), min_col - 1:min(max_col, n_cols)] = value
+                df = pd.DataFrame(arr)
+            if usecols is not None:
+                # 裁剪到该sheet实际存在的列：窄表不该让整本解析中断
+                present = [c for c in usecols if c < df.shape[1]]
+                if not present:
                     if verbose:
-                        print(f"跳过无效数据工作表: {sheet_name}", file=sys.stderr)
+                        print(f"跳过工作表 {sheet_name}: 请求的列不存在", file=sys.stderr)
                     continue
+                df = df.iloc[:, present]
+            # ==================== 转markdown ====================
+            if output_format == 'markdown':
+                md_table = to_markdown_table(df)
+                # 添加表格元数据
+                md_table = f"# Sheet: {sheet_name}\n{md_table}"
+                result.append(md_table)
+            else:
+                # 直接拼接字符串生成HTML：省去BeautifulSoup逐格建Tag对象和prettify整树重排
+                parts = ['<table border="1"><thead>']
+                # thead/tbody不好确定表头行数，全部放thead
+
+                # 合并填充后的数组即最终取值，循环内不再走ws.cell/df.iat逐格访问
+                vals = df.to_numpy(copy=False)
+                max_header_rows, num_cols = vals.shape
+                # 被合并单元格掩码：按区域切片置位，左上角主格除外，免去tuple键哈希
+                merged_mask = np.zeros(vals.shape, dtype=bool)
+                for min_row, min_col, max_row, max_col, _ in merges:
+                    merged_mask[min_row - 1:min(max_row, max_header_rows),
+                                min_col - 1:min(max_col, num_cols)] = True
+                    if min_row <= max_header_rows and min_col <= num_cols:
+                        merged_mask[min_row - 1, min_col - 1] = False
+                for row_idx in range(max_header_rows):
+                    parts.append('<tr>')
+                    col_idx = 0  # 列索引 (0-based)
+                    while col_idx < num_cols:
+                        # 转换为 openpyxl 的 1-based 索引
+                        cell_pos = (row_idx + 1, col_idx + 1)
 
-                # 应用合并单元格值覆盖
-                for (row, col), value in merge_map.items():
-                    # pandas的行号从0开始，openpyxl从1开始
-                    df_row = row - 1
-                    df_col = col - 1
-                    # 确保索引不越界
-                    if df_row < df.shape[0] and df_col < df.shape[1]:
-                        df.iat[df_row, df_col] = str(value)
-                # ==================== 转markdown ====================
-                if output_format == 'markdown':
-                    md_table = df.to_markdown()
-                    # 添加表格元数据
-                    md_table = f"# Sheet: {sheet_name}\n{md_table}"
-                    result.append(md_table)
-                else:
-                    soup = BeautifulSoup(features='html.parser')
-                    table = soup.new_tag('table', border="1")
-
-                    thead = soup.new_tag('thead')  # 表头有多少行不好去确定
-                    # tbody = soup.new_tag('tbody')  # TODO:本来想表头和数据部分分开 但是发现不好确定表头行数
-
-                    # max_header_rows = 3
-                    max_header_rows = df.shape[0]
-                    for row_idx in range(max_header_rows):
-                        tr = soup.new_tag('tr')
-                        col_idx = 0  # 列索引 (0-based)
-                        while col_idx < df.shape[1]:
-                            # 转换为 openpyxl 的 1-based 索引
-                            cell_pos = (row_idx + 1, col_idx + 1)
-
-                            if cell_pos in merge_info:
-                                rowspan, colspan = merge_info[cell_pos]
-                                cell_value = ws.cell(*cell_pos).value
-                                th = soup.new_tag('th', rowspan=str(rowspan), colspan=str(colspan))
-                                th.string = str(cell_value)
-                                tr.append(th)
-                                col_idx += colspan
-                            else:
-                                if cell_pos not in merge_cell:
-                                    th = soup.new_tag('th')
-                                    th.string = str(df.iat[row_idx, col_idx])
-                                    tr.append(th)
-                                col_idx += 1
-
-                        thead.append(tr)
-                    table.append(thead)
-                    result.append(str(table.prettify()))
+                        if cell_pos in merge_info:
+                            rowspan, colspan = merge_info[cell_pos]
+                            v = vals[row_idx, col_idx]
+                            parts.append(f'<th rowspan="{rowspan}" colspan="{colspan}">'
+                                         f'{escape("" if v is None else str(v))}</th>')
+                            col_idx += colspan
+                        else:
+                            if not merged_mask[row_idx, col_idx]:
+                                v = vals[row_idx, col_idx]
+                                parts.append(f'<th>{escape("" if v is None else str(v))}</th>')
+                            col_idx += 1
+
+                    parts.append('</tr>')
+                parts.append('</thead></table>')
+                result.append(''.join(parts))
         return result
 
     @staticmethod
-    def parse_xlrd(file_data: bytes, verbose=True, output_format='markdown') -> List[str]:  # .xls
+    def parse_xlrd(file_data: bytes, verbose=True, output_format='markdown',
+                   nrows=None, usecols=None) -> List[str]:  # .xls
         """
         将表格解析转换成markdown格式,只支持xls格式
         支持转换为html的表格格式输出 更好适应多级表头
         """
-        if not isinstance(file_data, bytes):
-            raise ValueError("file_data must be bytes")
-        file_bio = BytesIO(file_data)
+        if usecols is not None and output_format != 'markdown':
+            raise ValueError("usecols 只支持 markdown 输出（HTML合并跨度按原始列号计算）")
 
-        wb = xlrd.open_workbook(file_contents=file_data)
+        # on_demand按需加载sheet，处理完即可卸载，避免一次性物化整个工作簿
+        wb = xlrd.open_workbook(file_contents=file_data, on_demand=True)
         sheet_names = wb.sheet_names()
 
         result = []
@@ -203,103 +324,122 @@ class ExcelParser:
                 print(f"跳过空工作表: {sheet_name}", file=sys.stderr)
                 continue
 
-            merge_map = {}  # 记录合并单元格value
-            merge_cell = {}  # 记录被合并单元格坐标
-            merge_info = {}  # 记录合并单元格起始位置以及跨度
+            merge_info = {}  # 记录合并单元格起始位置以及跨度（仅HTML输出需要）
+            merges = []  # (min_row, max_row, min_col, max_col, 主值)，xlrd区间为半开
+            html_mode = output_format != 'markdown'
             for merged_cell in ws.merged_cells:
                 # cell (rlo, clo) (the top left one) will carry the data
                 # rlo, rhi, clo, chi = merged_cell
                 min_row, max_row, min_col, max_col = merged_cell
                 master_value = ws.cell_value(min_row, min_col)
+                merges.append((min_row, max_row, min_col, max_col, master_value))
+                if not html_mode:
+                    continue  # markdown只需填值，不用跨度信息
                 merge_info[(min_row, min_col)] = (
                     max_row - min_row + 1,
                     max_col - min_col + 1
                 )
-                for row in range(min_row, max_row):
-                    for col in range(min_col, max_col):
-                        merge_map[(row, col)] = master_value
-                        if (row, col) != (min_row, min_col):
-                            merge_cell[(row, col)] = True  # 记录被合并的单元格
 
             try:
-                df = pd.read_excel(file_bio, sheet_name=sheet_name, header=None).astype(str)
+                # xlrd打开后单元格值已在内存中，直接取row_values，省去pd.read_excel的二次解析
+                n_read = ws.nrows if nrows is None else min(ws.nrows, nrows)
+                rows = [ws.row_values(r) for r in range(n_read)]
+                # 保留原始dtype，转字符串推迟到渲染时逐格进行
+                df = pd.DataFrame(rows, dtype=object)
             except Exception as e:
                 print(f"读取工作表 {sheet_name} 失败: {str(e)}")
                 continue
 
             # 有效性验证（防止全空数据）
-            if df.map(lambda x: x.strip() if isinstance(x, str) else '').eq('').all().all():
+            if is_all_empty(df):
                 if verbose:
                     print(f"跳过无效数据工作表: {sheet_name}")
                 continue
 
-            # 应用合并单元格值覆盖
-            for (row, col), value in merge_map.items():
-                # pandas的行号从0开始，xlrd从0开始
-                df_row = row
-                df_col = col
-                # 确保索引不越界
-                if df_row < df.shape[0] and df_col < df.shape[1]:
-                    df.iat[df_row, df_col] = str(value)
+            # 应用合并单元格值覆盖：numpy切片一次填满整个区域，替代逐单元格iat写入。
+            # 注意要在自有的数组副本上填，再由它重建DataFrame：
+            # copy=False的视图在pandas开启写时复制(CoW)后是只读的
+            if merges:
+                arr = df.to_numpy(copy=True)
+                n_rows, n_cols = arr.shape
+                for min_row, max_row, min_col, max_col, value in merges:
+                    # pandas与xlrd的行列号都从0开始
+                    arr[min_row:min(max_row, n_rows), min_col:min(max_col, n_cols)] = value
+                df = pd.DataFrame(arr)
+            if usecols is not None:
+                # 裁剪到该sheet实际存在的列：窄表不该让整本解析中断
+                present = [c for c in usecols if c < df.shape[1]]
+                if not present:
+                    if verbose:
+                        print(f"跳过工作表 {sheet_name}: 请求的列不存在")
+                    continue
+                df = df.iloc[:, present]
 
             # ==================== 转markdown ====================
             if output_format == 'markdown':
-                md_table = df.to_markdown()
+                md_table = to_markdown_table(df)
                 # 添加表格元数据
                 md_table = f"# Sheet: {sheet_name}\n{md_table}"
                 result.append(md_table)
             else:
-                soup = BeautifulSoup(features='html.parser')
-                table = soup.new_tag('table', border="1")
-
-                thead = soup.new_tag('thead')  # 表头有多少行不好去确定
-                # tbody = soup.new_tag('tbody')  # TODO:本来想表头和数据部分分开 但是发现不好确定表头行数
-
-                # max_header_rows = 3
-                max_header_rows = df.shape[0]
+                # 直接拼接字符串生成HTML：省去BeautifulSoup逐格建Tag对象和prettify整树重排
+                parts = ['<table border="1"><thead>']
+                # thead/tbody不好确定表头行数，全部放thead
+
+                # 合并填充后的数组即最终取值，循环内不再走ws.cell_value/df.iat逐格访问
+                vals = df.to_numpy(copy=False)
+                max_header_rows, num_cols = vals.shape
+                # 被合并单元格掩码：按区域切片置位，左上角主格除外，免去tuple键哈希
+                merged_mask = np.zeros(vals.shape, dtype=bool)
+                for min_row, max_row, min_col, max_col, _ in merges:
+                    merged_mask[min_row:min(max_row, max_header_rows),
+                                min_col:min(max_col, num_cols)] = True
+                    if min_row < max_header_rows and min_col < num_cols:
+                        merged_mask[min_row, min_col] = False
                 for row_idx in range(max_header_rows):
-                    tr = soup.new_tag('tr')
+                    parts.append('<tr>')
                     col_idx = 0  # 列索引 (0-based)
-                    while col_idx < df.shape[1]:
+                    while col_idx < num_cols:
                         # 转换为 xlrd 的based 索引
                         cell_pos = (row_idx, col_idx)
                         if cell_pos in merge_info:
                             rowspan, colspan = merge_info[cell_pos]
-                            cell_value = ws.cell_value(*cell_pos)
-                            th = soup.new_tag('th', rowspan=str(rowspan), colspan=str(colspan))
-                            th.string = str(cell_value)
-                            tr.append(th)
+                            v = vals[row_idx, col_idx]
+                            parts.append(f'<th rowspan="{rowspan}" colspan="{colspan}">'
+                                         f'{escape("" if v is None else str(v))}</th>')
                             col_idx += colspan
                         else:
-                            if cell_pos not in merge_cell:
-                                th = soup.new_tag('th')
-                                th.string = str(df.iat[row_idx, col_idx])
-                                tr.append(th)
+                            if not merged_mask[row_idx, col_idx]:
+                                v = vals[row_idx, col_idx]
+                                parts.append(f'<th>{escape("" if v is None else str(v))}</th>')
                             col_idx += 1
 
-                    thead.append(tr)
-                table.append(thead)
-                result.append(str(table.prettify()))
+                    parts.append('</tr>')
+                parts.append('</thead></table>')
+                result.append(''.join(parts))
+
+            # 处理完即释放该sheet占用的内存
+            wb.unload_sheet(sheet_name)
 
         return result
 
     @staticmethod
-    def parse_csv(file_data: bytes, verbose=True, output_format='markdown') -> List[str]:
+    def parse_csv(file_data: bytes, verbose=True, output_format='markdown',
+                  nrows=None, usecols=None) -> List[str]:
         """
         将csv表格解析转换成markdown格式
         支持转换为html的表格格式输出 更好适应多级表头
         """
-        if not isinstance(file_data, bytes):
-            raise ValueError("file_data must be bytes")
         file_bio = BytesIO(file_data)
-        df = pd.read_csv(file_bio, header=None).astype(str)
+        # nrows/usecols直接下推给C引擎，采样时只解析需要的部分
+        df = pd.read_csv(file_bio, header=None, nrows=nrows, usecols=usecols)
 
         # 有效性验证（防止全空数据）
-        if df.map(lambda x: x.strip() if isinstance(x, str) else '').eq('').all().all():
+        if is_all_empty(df):
             raise ValueError("Empty dataframe")
 
         if output_format == 'markdown':
-            table = df.to_markdown()
+            table = to_markdown_table(df)
             # 添加表格元数据
             table = f"# Table: \n{table}"
         else:
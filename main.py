@@ -8,7 +8,6 @@ VerbaAurea - 高质量文档预处理工具
 
 import time
 import sys
-import os
 from typing import List, Tuple
 from datetime import datetime
 
@@ -41,7 +40,7 @@ except ImportError:
 
 # 导入项目模块
 from config_manager import load_config, show_config, edit_config, save_config
-from parallel_processor import process_all_documents
+from parallel_processor import process_all_documents, count_candidate_files
 from utils import check_dependencies
 
 # 创建Rich控制台
@@ -156,20 +155,18 @@ def process_documents_with_progress(config):
             console=console,
             expand=True
     ) as progress:
-        # 开始处理任务
-        scan_task = progress.add_task("[bright_yellow]扫描文档中...", total=100)
+        # 真实扫描：只数候选文档，耗时远小于处理本身
+        scan_task = progress.add_task("[bright_yellow]扫描文档中...", total=None)
+        candidate_count = count_candidate_files(config)
+        progress.update(scan_task, total=candidate_count, completed=candidate_count)
 
-        # 模拟扫描过程
-        for i in range(101):
-            progress.update(scan_task, completed=i)
-            time.sleep(0.01)
-
-        # 处理文档任务
+        # 处理文档任务：进度由process_all_documents的回调真实驱动
         task = progress.add_task("[cyan]处理文档中...", total=100)
 
-        # 调用实际处理函数，但需要修改process_all_documents来支持进度报告
-        # 这里简单模拟进度更新
-        total_files, processed_files, failed_files = process_all_documents(config)
+        total_files, processed_files, failed_files = process_all_documents(
+            config,
+            progress_callback=lambda done, total: progress.update(
+                task, completed=done * 100 // total if total else 100))
 
         # 确保进度条完成
         progress.update(task, completed=100)
@@ -369,20 +366,23 @@ def edit_config_interactive(config):
 
 def main():
     """主函数"""
-    # 清屏
-    os.system('cls' if os.name == 'nt' else 'clear')
+    # 清屏（ANSI转义序列直接清，不必fork一个shell去跑cls/clear）
+    console.clear()
 
-    # 显示标题和动画
+    # 显示标题
     display_header()
-    animated_loading()
+
+    # 加载配置
+    config = load_config()
+
+    # 开场动画是约3秒的纯sleep，默认跳过；交互场景可在配置ui节打开
+    if config.get("ui", {}).get("show_intro_animation", False):
+        animated_loading()
 
     # 检查必要的库
     console.print("[dim]正在检查系统依赖...[/dim]")
     check_dependencies()
 
-    # 加载配置
-    config = load_config()
-
     # 确保性能配置存在
     if "performance_settings" not in config:
         config["performance_settings"] = {
@@ -447,7 +447,7 @@ def main():
             break
 
         # 每次操作后清屏以保持界面干净
-        os.system('cls' if os.name == 'nt' else 'clear')
+        console.clear()
         display_header()
 
 
@@ -9,13 +9,82 @@
 import os
 import sys
 import time
-from multiprocessing import Pool, cpu_count, Manager
+from multiprocessing import Pool, Value
 from utils import get_script_dir
 
+# 结果统一通过worker返回值在master侧聚合。若将来需要跨进程进度计数，
+# 用multiprocessing.Value或imap_unordered的逐结果回调，不要引入Manager
+# （Manager的代理对象每次访问都要绕行server进程，开销很大）。
 
-def collect_files_to_process(config):
+def _available_cpus():
+    """当前进程实际可用的CPU数（容器里按cgroup配额，而不是宿主机核数）"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:  # 非Linux平台
+        return os.cpu_count() or 1
 
-    """收集需要处理的文件列表"""
+
+# 识别Word文档的扩展名（统一小写比较，兼容.DOCX等大写后缀）
+_DOCX_EXTS = frozenset({'.docx', '.doc'})
+
+
+# worker进程内的状态：由_init_worker在进程启动时设置一次，任务参数不再携带config
+_WORKER_CONFIG = None
+_INSERT = None
+# 共享内存中的完成计数（multiprocessing.Value，不走Manager的server进程）
+_WORKER_COUNTER = None
+
+
+def _init_worker(cfg, counter=None):
+    """Pool worker初始化：config只在进程启动时pickle一次，而不是每个任务一次"""
+    global _WORKER_CONFIG, _INSERT, _WORKER_COUNTER
+    _WORKER_CONFIG = cfg
+    _WORKER_COUNTER = counter
+    # 处理函数也在这里导入并绑定一次，worker内不再每个文件走一遍import机制。
+    # 顺带把docx/lxml的导入税（约百余毫秒）付在进程启动期，与master的扫描重叠，
+    # 而不是算进第一个文件的处理时间（worker被maxtasksperchild回收后同理）
+    from document_processor import insert_split_markers
+    _INSERT = insert_split_markers
+    import docx  # noqa: F401
+    import lxml.etree  # noqa: F401
+
+
+def _iter_docx(root, skip_dir):
+    """基于os.scandir遍历目录树，产出Word文档路径
+
+    目录/文件类型直接取readdir的d_type，免去os.walk逐项stat；
+    跳过隐藏目录、输出目录skip_dir和~$临时文件。
+    """
+    stack = [root]
+    while stack:
+        current = stack.pop()
+        try:
+            with os.scandir(current) as it:
+                for entry in it:
+                    name = entry.name
+                    if entry.is_dir(follow_symlinks=False):
+                        if name.startswith('.') or name == skip_dir:
+                            continue
+                        stack.append(entry.path)
+                    elif not name.startswith('~$'):
+                        dot = name.rfind('.')
+                        if dot != -1 and name[dot:].lower() in _DOCX_EXTS:
+                            yield entry.path
+        except PermissionError:
+            continue
+
+
+def _is_up_to_date(input_path, output_path):
+    """输出文件存在且不旧于输入文件时视为已处理"""
+    try:
+        return os.stat(output_path).st_mtime >= os.stat(input_path).st_mtime
+    except OSError:
+        return False
+
+
+def iter_files_to_process(config):
+
+    """惰性产出 (输入路径, 输出路径)，边扫描边供给进程池"""
     # 获取脚本当前路径
     current_dir = get_script_dir()
 
@@ -24,54 +93,61 @@ def collect_files_to_process(config):
     output_base_dir = os.path.join(current_dir, output_folder)
     os.makedirs(output_base_dir, exist_ok=True)
 
-    files_to_process = []
+    created_dirs = {output_base_dir}  # 已建过的输出目录，同目录多文件时免去重复mkdir
+    skip_existing = config["processing_options"].get("skip_existing", False)
+
+    # 扫描产出的路径都以current_dir为前缀，切片取相对路径即可，免去逐条relpath解析
+    base = current_dir if current_dir.endswith(os.sep) else current_dir + os.sep
+    base_len = len(base)
 
     # 遍历当前目录及子目录
-    for root, dirs, files in os.walk(current_dir):
-        # 跳过输出文件夹和跳过隐藏目录
-        if output_folder in root or os.path.basename(root).startswith('.'):
+    for input_path in _iter_docx(current_dir, output_folder):
+        # 构建输出路径，保持原始目录结构
+        output_path = os.path.join(output_base_dir, input_path[base_len:])
+        output_dir = os.path.dirname(output_path)
+
+        if output_dir not in created_dirs:
+            os.makedirs(output_dir, exist_ok=True)
+            created_dirs.add(output_dir)
+
+        # 增量处理：输出已是最新时不再入队，省去worker往返
+        if skip_existing and _is_up_to_date(input_path, output_path):
             continue
 
-        # 创建相对路径
-        rel_path = os.path.relpath(root, current_dir)
-        if rel_path == ".":  # 当前目录
-            rel_path = ""
-
-        # 收集当前目录下的所有Word文档
-        for file in files:
-            if file.endswith(('.docx', '.doc')) and not file.startswith('~$'):  # 排除临时文件
-                # 构建输入和输出路径
-                input_path = os.path.join(root, file)
-
-                # 构建输出路径，保持原始目录结构
-                if rel_path:
-                    output_dir = os.path.join(output_base_dir, rel_path)
-                    os.makedirs(output_dir, exist_ok=True)
-                else:
-                    output_dir = output_base_dir
+        yield (input_path, output_path)
+
 
-                output_path = os.path.join(output_dir, file)
+def collect_files_to_process(config):
+    """收集需要处理的文件列表"""
+    return list(iter_files_to_process(config))
+
+
+def count_candidate_files(config):
+    """只统计候选Word文档数量，不构建输出路径（供扫描进度展示用）"""
+    current_dir = get_script_dir()
+    output_folder = config["processing_options"]["output_folder"]
+    return sum(1 for _ in _iter_docx(current_dir, output_folder))
 
-                # 添加到待处理文件列表
-                files_to_process.append((input_path, output_path))
 
-    return files_to_process
+def _count_done():
+    """worker侧原子递增完成数，master可随时读取用于细粒度进度"""
+    if _WORKER_COUNTER is not None:
+        with _WORKER_COUNTER.get_lock():
+            _WORKER_COUNTER.value += 1
 
 
 def _process_file(args):
     """
     处理单个文件的工作函数
-    避免顶层导入，在函数内部导入document_processor
+    document_processor已在_init_worker中导入为_INSERT
     """
-    input_path, output_path, config = args
+    input_path, output_path = args
+    config = _WORKER_CONFIG
 
-    # 将导入放在函数内部，避免循环导入问题
     try:
-        # 导入处理模块
-        from document_processor import insert_split_markers
-
         # 处理文件
-        success = insert_split_markers(input_path, output_path, config)
+        success = _INSERT(input_path, output_path, config)
+        _count_done()
         return {
             'input_path': input_path,
             'output_path': output_path,
@@ -79,29 +155,26 @@ def _process_file(args):
             'error': None
         }
     except Exception as e:
-        # 记录错误信息
-        error_msg = f"{type(e).__name__}: {str(e)}"
-        print(f"处理文件 {input_path} 时出错: {error_msg}")
+        # 错误信息随返回值带回master侧统一报告，worker不直接写stdout
+        # （多进程并发print会在共享fd上互相穿插，还会打花master的Rich界面）
+        _count_done()
         return {
             'input_path': input_path,
             'output_path': output_path,
             'success': False,
-            'error': error_msg
+            'error': f"{type(e).__name__}: {str(e)}"
         }
 
 
-def _process_batch(batch_args):
+def _process_batch(batch_files):
     """处理一批文件，减少进程创建开销"""
-    batch_files, config = batch_args
+    config = _WORKER_CONFIG
     results = []
 
     for input_path, output_path in batch_files:
         try:
-            # 导入处理模块
-            from document_processor import insert_split_markers
-
             # 处理文件
-            success = insert_split_markers(input_path, output_path, config)
+            success = _INSERT(input_path, output_path, config)
             results.append({
                 'input_path': input_path,
                 'output_path': output_path,
@@ -109,26 +182,35 @@ def _process_batch(batch_args):
                 'error': None
             })
         except Exception as e:
-            # 记录错误信息
-            error_msg = f"{type(e).__name__}: {str(e)}"
-            print(f"处理文件 {input_path} 时出错: {error_msg}")
+            # 同_process_file：错误带回master侧统一报告
             results.append({
                 'input_path': input_path,
                 'output_path': output_path,
                 'success': False,
-                'error': error_msg
+                'error': f"{type(e).__name__}: {str(e)}"
             })
+        _count_done()
 
     return results
 
 
-def process_all_documents(config):
+def process_all_documents(config, progress_callback=None):
     """
     并行处理所有Word文档
     使用多进程处理以突破GIL限制
+    progress_callback(done, total)在每个文件处理完后回调，用于驱动进度条
     """
     debug_mode = config["processing_options"].get("debug_mode", False)
 
+    # 获取性能设置
+    perf_settings = config.get("performance_settings", {})
+    use_parallel = perf_settings.get("parallel_processing", True)
+
+    if use_parallel and perf_settings.get("batch_size", 1) <= 1 and progress_callback is None:
+        # 不需要预知总数（没有进度回调、不分批）时走流式路径：
+        # 目录扫描直接供给进程池，worker无需等全量列表物化完毕
+        return _process_stream(iter_files_to_process(config), config)
+
     # 收集需要处理的文件
     files_to_process = collect_files_to_process(config)
     total_files = len(files_to_process)
@@ -138,18 +220,71 @@ def process_all_documents(config):
             print("没有找到需要处理的Word文档")
         return 0, 0, []
 
-    # 获取性能设置
+    # 如果不使用并行，则顺序处理（复用已收集的文件列表，不再扫一遍目录树）
+    if not use_parallel:
+        return process_sequentially(config, files_to_process, progress_callback)
+
+    return process_files(files_to_process, config, progress_callback)
+
+
+def _process_stream(file_iter, config):
+    """把惰性文件流直接喂给进程池，扫描与处理重叠进行"""
+    debug_mode = config["processing_options"].get("debug_mode", False)
     perf_settings = config.get("performance_settings", {})
-    use_parallel = perf_settings.get("parallel_processing", True)
 
-    # 如果不使用并行，则顺序处理
-    if not use_parallel:
-        return process_sequentially(config)
+    num_workers = perf_settings.get("num_workers", 0)
+    if num_workers <= 0:
+        num_workers = max(1, _available_cpus() - 1)
+    num_workers = min(num_workers, 8)
+
+    max_tasks = perf_settings.get("max_tasks_per_child", 50)
+
+    if debug_mode:
+        print(f"启用流式多进程并行处理，使用 {num_workers} 个工作进程")
+
+    total_files = 0
+    processed_files = 0
+    failed_files = []
+
+    try:
+        with Pool(processes=num_workers, initializer=_init_worker,
+                  initargs=(config,), maxtasksperchild=max_tasks) as pool:
+            # 总数未知，chunksize取小值避免尾部任务分配不均
+            for result in pool.imap_unordered(_process_file, file_iter, chunksize=4):
+                total_files += 1
+                if result['success']:
+                    processed_files += 1
+                else:
+                    failed_files.append(result['input_path'])
+                    if debug_mode:
+                        print(f"处理文件 {result['input_path']} 时出错: {result['error']}")
+    except Exception as e:
+        if debug_mode:
+            print(f"并行处理过程中发生错误: {str(e)}")
+
+    if total_files == 0 and debug_mode:
+        print("没有找到需要处理的Word文档")
+
+    return total_files, processed_files, failed_files
+
+
+def process_files(files_to_process, config, progress_callback=None):
+    """并行处理给定的 (输入路径, 输出路径) 列表
+
+    每个文件的处理相互独立（打开docx → 分析 → 写出docx），
+    直接交给进程池即可按核数扩展。
+    """
+    debug_mode = config["processing_options"].get("debug_mode", False)
+    perf_settings = config.get("performance_settings", {})
+    total_files = len(files_to_process)
+
+    if total_files == 0:
+        return 0, 0, []
 
     # 确定工作进程数
     num_workers = perf_settings.get("num_workers", 0)
     if num_workers <= 0:
-        num_workers = max(1, cpu_count() - 1)  # 默认使用CPU核心数-1
+        num_workers = max(1, _available_cpus() - 1)  # 默认使用可用核心数-1
 
     # 为避免过多进程带来的开销，根据文件数量调整工作进程数
     num_workers = min(num_workers, max(1, total_files), 8)
@@ -158,46 +293,57 @@ def process_all_documents(config):
     batch_size = perf_settings.get("batch_size", 1)
     use_batch = batch_size > 1
 
+    # 定期回收worker，防止lxml解析残留使长批量任务的RSS持续膨胀
+    max_tasks = perf_settings.get("max_tasks_per_child", 50)
+
     if debug_mode:
         print(f"启用{'批处理' if use_batch else ''}多进程并行处理，使用 {num_workers} 个工作进程")
 
     processed_files = 0
     failed_files = []
+    done = 0
+
+    # 共享计数器按文件递增，批处理模式下进度不受批粒度限制
+    progress_counter = Value('i', 0)
 
     try:
         if use_batch:
-            # 批处理模式
-            batches = []
-            current_batch = []
-
-            # 将文件分组为批次
-            for file_pair in files_to_process:
-                current_batch.append(file_pair)
-                if len(current_batch) >= batch_size:
-                    batches.append((current_batch.copy(), config))
-                    current_batch = []
-
-            if current_batch:  # 添加最后一个不完整的批次
-                batches.append((current_batch.copy(), config))
-
-            with Pool(processes=num_workers) as pool:
-                # 使用进程池处理批次
-                for batch_results in pool.imap(_process_batch, batches):
+            # 批处理模式：按batch_size切片分批，免去逐项append+copy
+            batches = [files_to_process[i:i + batch_size]
+                       for i in range(0, total_files, batch_size)]
+
+            with Pool(processes=num_workers, initializer=_init_worker,
+                      initargs=(config, progress_counter), maxtasksperchild=max_tasks) as pool:
+                # 使用进程池处理批次；无序返回，避免慢批阻塞结果流
+                for batch_results in pool.imap_unordered(_process_batch, batches):
                     for result in batch_results:
+                        done += 1
                         if result['success']:
                             processed_files += 1
                         else:
                             failed_files.append(result['input_path'])
+                            if debug_mode:
+                                print(f"处理文件 {result['input_path']} 时出错: {result['error']}")
+                    if progress_callback:
+                        # 批结果一次回传多个文件，读共享计数获得逐文件粒度
+                        progress_callback(min(progress_counter.value, total_files), total_files)
         else:
-            # 单文件处理模式
-            work_items = [(input_path, output_path, config) for input_path, output_path in files_to_process]
-
-            with Pool(processes=num_workers) as pool:
-                for result in pool.imap(_process_file, work_items):
+            # 单文件处理模式：任务项只剩路径对，config经initializer下发
+            # 成块领取任务减少IPC往返；无序返回，慢文件不阻塞其他结果
+            chunksize = max(1, total_files // (num_workers * 4))
+
+            with Pool(processes=num_workers, initializer=_init_worker,
+                      initargs=(config, progress_counter), maxtasksperchild=max_tasks) as pool:
+                for result in pool.imap_unordered(_process_file, files_to_process, chunksize=chunksize):
+                    done += 1
                     if result['success']:
                         processed_files += 1
                     else:
                         failed_files.append(result['input_path'])
+                        if debug_mode:
+                            print(f"处理文件 {result['input_path']} 时出错: {result['error']}")
+                    if progress_callback:
+                        progress_callback(done, total_files)
 
     except Exception as e:
         if debug_mode:
@@ -206,12 +352,16 @@ def process_all_documents(config):
     return total_files, processed_files, failed_files
 
 
-def process_sequentially(config):
-    """顺序处理所有Word文档（非并行方式）"""
+def process_sequentially(config, files_to_process=None, progress_callback=None):
+    """顺序处理所有Word文档（非并行方式）
+
+    files_to_process为None时自行收集，调用方已收集过则直接传入。
+    """
     debug_mode = config["processing_options"].get("debug_mode", False)
 
     # 收集所有需要处理的文件
-    files_to_process = collect_files_to_process(config)
+    if files_to_process is None:
+        files_to_process = collect_files_to_process(config)
     total_files = len(files_to_process)
 
     if total_files == 0:
@@ -238,6 +388,9 @@ def process_sequentially(config):
             else:
                 failed_files.append(input_path)
 
+            if progress_callback:
+                progress_callback(i + 1, total_files)
+
             # 显示进度
             if debug_mode:
                 progress = (i + 1) / total_files * 100
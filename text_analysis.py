@@ -6,61 +6,139 @@
 负责段落分析、语义结构识别、句子边界检测等
 """
 
-import jieba
+import re
+
 import nltk
-from nltk.tokenize import sent_tokenize
 import functools
-from docx.oxml.text.paragraph import CT_P
-from docx.oxml.table import CT_Tbl
-# 初始化 NLTK 和 Jieba
+from docx.oxml.ns import qn
+
+# 可选的快速英文分句器：nupunkt为纯正则/查表实现，吞吐远高于NLTK Punkt
 try:
-    nltk.data.find('tokenizers/punkt')
-except LookupError:
-    nltk.download('punkt')
+    from nupunkt import sent_tokenize as _fast_sent_tokenize
+    _HAVE_NUPUNKT = True
+except ImportError:
+    _HAVE_NUPUNKT = False
+
+# 段落/表格/单元格/文本节点的限定名，lxml遍历时直接比较
+_W_P = qn('w:p')
+_W_TBL = qn('w:tbl')
+_W_T = qn('w:t')
+_W_TC = qn('w:tc')
+
+
+@functools.lru_cache(maxsize=1)
+def _ensure_punkt():
+    """首次真正用到NLTK分句时才检查/下载punkt_tab，避免每次import都触发"""
+    try:
+        nltk.data.find('tokenizers/punkt_tab')
+    except LookupError:
+        nltk.download('punkt_tab', quiet=True)
+
+# 模块级预编译：句末标点（允许跟随引号/括号和空白）
+_SENT_END_RE = re.compile(r'[。！？.!?；;]["\'）)\]』」]*\s*$')
+# 句末标点本体，用于在拼接窗口内定位句子边界
+_SENT_PUNCT_RE = re.compile(r'[。！？.!?；;]')
+# CJK统一表意文字区间，判断文本是否含中文
+_CJK_RE = re.compile(r'[\u4e00-\u9fff]')
+# 列表项前缀：项目符号或"数字."编号
+_LIST_RE = re.compile(r'^(?:[•\-*]|\d+\.)')
+# 句末标点集合：末字符的frozenset成员测试比endswith(tuple)少一层逐项分派
+_END_SET = frozenset('。！？.!?；;')
+# 中文分句：在句末标点之后切开（标点保留在句尾）
+_CN_SENT_SPLIT_RE = re.compile(r'(?<=[。！？.!?])')
+
+
+class ElemType:
+    """elements_info 元素类型常量：整数比较省去逐字符的字符串相等判断"""
+    PARA = 0
+    TABLE = 1
+
+
+class ParaInfo:
+    """analyze_document 的段落记录
+
+    __slots__ 定长存储：属性访问走槽位偏移，比dict下标快，
+    且每条记录省去一个哈希表的内存开销。
+    """
+    __slots__ = ('index', 'text', 'length', 'is_heading', 'is_list_item',
+                 'ends_with_period', 'length_category')
+
+    def __init__(self, index, text, length, is_heading, is_list_item,
+                 ends_with_period, length_category):
+        self.index = index
+        self.text = text
+        self.length = length
+        self.is_heading = is_heading
+        self.is_list_item = is_list_item
+        self.ends_with_period = ends_with_period
+        self.length_category = length_category
+
+
+class ElemInfo:
+    """extract_elements_info 的元素记录，同样采用 __slots__"""
+    __slots__ = ('type', 'i_para', 'i_table', 'text', 'length',
+                 'is_heading', 'is_list_item', 'ends_with_period')
+
+    def __init__(self, type, i_para, i_table, text, length,
+                 is_heading, is_list_item, ends_with_period):
+        self.type = type
+        self.i_para = i_para
+        self.i_table = i_table
+        self.text = text
+        self.length = length
+        self.is_heading = is_heading
+        self.is_list_item = is_list_item
+        self.ends_with_period = ends_with_period
 
 
-@functools.lru_cache(maxsize=1024)  # 缓存结果以提高性能
 def is_sentence_boundary(text_before, text_after):
-    """判断两段文本之间是否为句子边界"""
-    # 检查前文是否以句号结尾
-    if text_before.endswith(('。', '！', '？', '.', '!', '?', '；', ';')):
+    """判断两段文本之间是否为句子边界
+
+    判定只依赖连接处附近的字符，因此缓存键截断到前文末尾/后文开头
+    各8个字符：长段落不再整串哈希，不同段落共享相同结尾时还能命中同一条目。
+    """
+    return _boundary_impl(text_before[-8:], text_after[:8])
+
+
+@functools.lru_cache(maxsize=4096)
+def _boundary_impl(tail, head):
+    # 前文是否以句号结尾
+    if _SENT_END_RE.search(tail):
         return True
 
-    # 使用jieba进行更精确的句子边界检测
-    combined_text = text_before + " " + text_after
-    try:
-        # 区分中英文进行句子分割
-        if any(u'\u4e00' <= char <= u'\u9fff' for char in combined_text):
-            # 中文文本，使用jieba分句
-            sentences = list(jieba.cut(combined_text))
-            # 检查分词结果中是否有明显的句子边界
-            for i, word in enumerate(sentences[:-1]):
-                if word in ['。', '！', '？', '.', '!', '?', '；', ';']:
-                    # 检查这个边界是否接近text_before和text_after的连接处
-                    before_seg = ''.join(sentences[:i + 1])
-                    if (len(before_seg) - len(text_before)) < 5:
-                        return True
-        else:
-            # 英文文本，使用NLTK
-            sentences = sent_tokenize(combined_text)
-            # 检查是否能在组合文本中找到明确的句子分界点
-            for sentence in sentences:
-                if text_before.endswith(sentence) or text_after.startswith(sentence):
-                    return True
-    except:
-        pass
+    # 退化情形：连接处附近出现句末标点即视为边界。
+    # 原先把拼接文本交给jieba/NLTK整段切分，只为定位一个标点；
+    # 正则在C层扫描连接处两侧的小窗口，不做词典分词
+    if _SENT_PUNCT_RE.search(tail) or _SENT_PUNCT_RE.search(head[:4]):
+        return True
 
     return False
 
 
-def find_nearest_sentence_boundary(paragraphs_info, current_index, search_window=5):
-    """寻找距离当前位置最近的句子边界"""
+def find_nearest_sentence_boundary(paragraphs_info, current_index, search_window=5,
+                                   boundary=None):
+    """寻找距离当前位置最近的句子边界
+
+    boundary 为预计算的句界位图（boundary[i] 表示第 i-1/i 段之间是句界），
+    传入时窗口扫描只做 O(1) 查表，不再逐对调用 is_sentence_boundary。
+    """
     best_index = -1
     min_distance = float('inf')
 
+    if boundary is None:
+        def _is_boundary(i):
+            prev = paragraphs_info[i - 1]
+            # 分析阶段已算出的句末标志命中即是边界，省去正则判定
+            if prev.ends_with_period:
+                return True
+            return is_sentence_boundary(prev.text, paragraphs_info[i].text)
+    else:
+        def _is_boundary(i):
+            return boundary[i]
+
     # 向前查找
     for i in range(max(0, current_index - search_window), current_index + 1):
-        if i > 0 and is_sentence_boundary(paragraphs_info[i - 1]['text'], paragraphs_info[i]['text']):
+        if i > 0 and _is_boundary(i):
             distance = current_index - i
             if 0 <= distance < min_distance:
                 min_distance = distance
@@ -68,7 +146,7 @@ def find_nearest_sentence_boundary(paragraphs_info, current_index, search_window
 
     # 向后查找
     for i in range(current_index + 1, min(len(paragraphs_info), current_index + search_window + 1)):
-        if i > 0 and is_sentence_boundary(paragraphs_info[i - 1]['text'], paragraphs_info[i]['text']):
+        if i > 0 and _is_boundary(i):
             distance = i - current_index
             if distance < min_distance:
                 min_distance = distance
@@ -80,52 +158,34 @@ def find_nearest_sentence_boundary(paragraphs_info, current_index, search_window
 def analyze_document(doc, debug_mode=False):
     """分析文档，提取段落信息和语义块"""
     paragraphs_info = []
-    total_text = ""
+    style_is_heading = {}  # 样式对象 -> 是否标题；同一文档样式数远小于段落数
 
     # 提取段落信息
     for i, paragraph in enumerate(doc.paragraphs):
         text = paragraph.text.strip()
         if not text:  # 跳过空段落，但记录它们以保持索引一致
-            paragraphs_info.append({
-                'index': i,
-                'text': "",
-                'length': 0,
-                'is_heading': False,
-                'is_list_item': False,
-                'ends_with_period': False,
-                'length_category': "empty"
-            })
+            paragraphs_info.append(ParaInfo(i, "", 0, False, False, False, "empty"))
             continue
 
-        # 判断段落类型
-        is_heading = paragraph.style.name.startswith(('Heading', '标题'))
-        is_list_item = text.startswith(('•', '-', '*', '1.', '2.', '3.')) or (
-                len(text) > 2 and text[0].isdigit() and text[1] == '.')
+        # 判断段落类型（样式名判断按样式缓存，免去每段的lxml属性访问）
+        style = paragraph.style
+        sid = id(style.element)
+        is_heading = style_is_heading.get(sid)
+        if is_heading is None:
+            is_heading = style.name.startswith(('Heading', '标题'))
+            style_is_heading[sid] = is_heading
+        is_list_item = _LIST_RE.match(text) is not None
 
         # 段落长度分类
         length_category = "short" if len(text) < 50 else "medium" if len(text) < 200 else "long"
 
         # 尝试判断段落是否为完整句子结束
-        ends_with_period = text.endswith(('。', '！', '？', '.', '!', '?', '；', ';'))
+        ends_with_period = bool(text) and text[-1] in _END_SET
 
         # 将段落信息保存起来
-        paragraphs_info.append({
-            'index': i,
-            'text': text,
-            'length': len(text),
-            'is_heading': is_heading,
-            'is_list_item': is_list_item,
-            'ends_with_period': ends_with_period,
-            'length_category': length_category
-        })
-
-        total_text += text + " "
-
-    # 使用NLTK尝试进行句子拆分（用于辅助判断语义边界）
-    try:
-        analyze_sentence_structure(total_text)
-    except:
-        pass
+        paragraphs_info.append(ParaInfo(i, text, len(text), is_heading,
+                                        is_list_item, ends_with_period,
+                                        length_category))
 
     # 预处理阶段：尝试将连续的短段落组合成语义块
     semantic_blocks = identify_semantic_blocks(paragraphs_info)
@@ -135,54 +195,71 @@ def analyze_document(doc, debug_mode=False):
 
 def analyze_sentence_structure(text):
     """分析文本的句子结构"""
-    # 判断文本主要是中文还是英文
-    if any(u'\u4e00' <= char <= u'\u9fff' for char in text):
-        # 中文文本使用jieba分词和分句
-        words = list(jieba.cut(text))
-        sentences = []
-        temp = ""
-        for word in words:
-            temp += word
-            if word in ['。', '！', '？', '.', '!', '?']:
-                sentences.append(temp)
-                temp = ""
-        if temp:  # 添加最后一个可能不完整的句子
-            sentences.append(temp)
+    # 判断文本主要是中文还是英文（正则在C层扫描，首个命中即返回）
+    if _CJK_RE.search(text):
+        # 中文按句末标点正则切分；原先的jieba逐词累积只用分词结果
+        # 定位标点，切出的句子与直接按标点切完全一致
+        sentences = [s for s in _CN_SENT_SPLIT_RE.split(text) if s]
     else:
-        # 英文文本使用NLTK
-        sentences = sent_tokenize(text)
+        # 英文文本使用NLTK（结果缓存，同一文本跨遍历重复切分时直接命中）
+        sentences = list(_sent_tokenize_cached(text))
 
     return sentences
 
 
+@functools.lru_cache(maxsize=1)
+def _punkt():
+    """加载并复用Punkt分句器实例；sent_tokenize每次调用都会重新构建"""
+    _ensure_punkt()
+    return nltk.tokenize.PunktTokenizer('english')
+
+
+@functools.lru_cache(maxsize=256)
+def _sent_tokenize_cached(text):
+    """英文分句的缓存包装，返回tuple以便可哈希存储"""
+    if _HAVE_NUPUNKT:
+        return tuple(_fast_sent_tokenize(text))
+    return tuple(_punkt().tokenize(text))
+
+
 def identify_semantic_blocks(paragraphs_info):
     """识别文档中的语义块"""
     semantic_blocks = []
-    temp_block = {'text': '', 'paragraphs': []}
+    # 块内文本先按段收集，关块时一次join成串，避免逐段字符串拼接
+    block_parts = []
+    block_paragraphs = []
+
+    def _flush():
+        semantic_blocks.append({
+            'text': ' '.join(block_parts) + ' ',
+            'paragraphs': block_paragraphs
+        })
 
     for i, para_info in enumerate(paragraphs_info):
-        if para_info['length'] == 0:  # 跳过空段落
+        if para_info.length == 0:  # 跳过空段落
             continue
 
         # 如果是标题或列表项开始，结束前一个块
-        if para_info['is_heading'] or (
-                para_info['is_list_item'] and (i == 0 or not paragraphs_info[i - 1]['is_list_item'])):
-            if temp_block['text']:
-                semantic_blocks.append(temp_block)
-                temp_block = {'text': '', 'paragraphs': []}
+        if para_info.is_heading or (
+                para_info.is_list_item and (i == 0 or not paragraphs_info[i - 1].is_list_item)):
+            if block_parts:
+                _flush()
+                block_parts = []
+                block_paragraphs = []
 
         # 添加到当前块
-        temp_block['text'] += para_info['text'] + ' '
-        temp_block['paragraphs'].append(i)
+        block_parts.append(para_info.text)
+        block_paragraphs.append(i)
 
         # 如果段落结束一个完整句子，且不是短段落，也考虑结束当前块
-        if para_info['ends_with_period'] and para_info['length'] > 100:
-            semantic_blocks.append(temp_block)
-            temp_block = {'text': '', 'paragraphs': []}
+        if para_info.ends_with_period and para_info.length > 100:
+            _flush()
+            block_parts = []
+            block_paragraphs = []
 
     # 添加最后一个块
-    if temp_block['text']:
-        semantic_blocks.append(temp_block)
+    if block_parts:
+        _flush()
 
     return semantic_blocks
 
@@ -190,70 +267,58 @@ def identify_semantic_blocks(paragraphs_info):
 
 def extract_elements_info(doc, table_length_factor=1.0, debug_mode=False):
     """
-    按文档布局顺序返回 elements_info 列表，每一项：
-       {
-         'type'        : 'para' | 'table',
-         'i_para'      : 段落索引 (仅 para 有),
-         'i_table'     : 表格索引 (仅 table 有),
-         'length'      : 文本字符数 * table_length_factor,
-         'text'        : 纯文本(表格=单元格文本拼接),
-         'is_heading'  : ...
-         'is_list_item': ...
-         'ends_with_period': ...
-       }
+    按文档布局顺序返回 ElemInfo 列表，字段：
+       type        : ElemType.PARA | ElemType.TABLE
+       i_para      : 段落索引 (仅 para 有)
+       i_table     : 表格索引 (仅 table 有)
+       length      : 文本字符数 * table_length_factor
+       text        : 纯文本(表格=单元格文本拼接)
+       is_heading / is_list_item / ends_with_period
     """
     elements = []
     para_idx = -1
     tbl_idx  = -1
 
-    paragraph_map = {p._element: p for p in doc.paragraphs}
-    table_map     = {t._element: t for t in doc.tables}
+    # 样式id -> 样式名：一次取全，段落循环里不再经过python-docx的样式解析
+    style_names = {s.style_id: s.name for s in doc.styles}
+    style_is_heading = {}  # 样式id -> 是否标题；同一文档样式数远小于段落数
 
-    for el in doc._element.body:
+    # iterchildren 在C层按标签过滤body子元素（sectPr等直接跳过），
+    # 循环里比较标签字符串即可区分段落/表格，不走isinstance分派
+    for el in doc._element.body.iterchildren(_W_P, _W_TBL):
         # ---------- 段落 ----------
-        if isinstance(el, CT_P):
+        if el.tag == _W_P:
             para_idx += 1
-            p = paragraph_map[el]
-            text = p.text.strip()
-            is_heading = p.style.name.startswith(('Heading', '标题'))
-            is_list_item = text.startswith(('•', '-', '*', '1.', '2.', '3.')) or (
-                           len(text) > 2 and text[0].isdigit() and text[1] == '.')
-            ends_with_period = text.endswith(('。', '！', '？', '.', '!', '?', '；', ';'))
-
-            elements.append({
-                'type': 'para',
-                'i_para': para_idx,
-                'i_table': None,
-                'text': text,
-                'length': len(text),
-                'is_heading': is_heading,
-                'is_list_item': is_list_item,
-                'ends_with_period': ends_with_period
-            })
+            # 直接在lxml层拼接 w:t 文本，跳过 Paragraph/Run 包装对象的构造
+            text = ''.join(t.text for t in el.iter(_W_T) if t.text).strip()
+            sid = el.style  # pStyle 的styleId；None表示默认样式（Normal）
+            is_heading = style_is_heading.get(sid)
+            if is_heading is None:
+                is_heading = style_names.get(sid, '').startswith(('Heading', '标题'))
+                style_is_heading[sid] = is_heading
+            is_list_item = _LIST_RE.match(text) is not None
+            ends_with_period = bool(text) and text[-1] in _END_SET
+
+            elements.append(ElemInfo(ElemType.PARA, para_idx, None, text,
+                                     len(text), is_heading, is_list_item,
+                                     ends_with_period))
 
         # ---------- 表格 ----------
-        elif isinstance(el, CT_Tbl):
+        else:
             tbl_idx += 1
-            tbl = table_map[el]
-            # 统计表格文本
+            # 统计表格文本：直接按 w:tc 遍历，跳过 Table/Row/Cell 包装，
+            # 也避免 row.cells 把合并单元格重复计入
             texts = []
-            for row in tbl.rows:
-                for cell in row.cells:
-                    if cell.text:
-                        texts.append(cell.text.strip())
+            for tc in el.iter(_W_TC):
+                cell_text = ''.join(t.text for t in tc.iter(_W_T) if t.text).strip()
+                if cell_text:
+                    texts.append(cell_text)
             tbl_text = ' '.join(texts)
             tbl_len  = int(len(tbl_text) * table_length_factor)
 
-            elements.append({
-                'type': 'table',
-                'i_para': None,
-                'i_table': tbl_idx,
-                'text': tbl_text,
-                'length': tbl_len,
-                'is_heading': False,
-                'is_list_item': False,
-                'ends_with_period': True      # 视为天然边界
-            })
+            # ends_with_period=True：表格视为天然边界
+            elements.append(ElemInfo(ElemType.TABLE, None, tbl_idx, tbl_text,
+                                     tbl_len, False, False, True))
 
     if debug_mode:
         print(f"[extract] 生成 elements_info 共 {len(elements)} 条，其中表格 {tbl_idx+1} 个")
@@ -6,9 +6,12 @@
 包含各种辅助函数
 """
 
+import importlib.util
 import os
 import sys
 
+_MB = 1 << 20
+
 
 def get_script_dir():
     """获取脚本当前路径"""
@@ -19,22 +22,15 @@ def get_script_dir():
 
 
 def check_dependencies():
-    """检查必要的依赖库"""
-    required_libs = ['nltk', 'jieba', 'python-docx']
-    missing_libs = []
+    """检查必要的依赖库
 
-    for lib in required_libs:
-        try:
-            # 特殊处理 python-docx (import名称是docx)
-            if lib == 'python-docx':
-                __import__('docx')
-            else:
-                __import__(lib)
-        except ImportError:
-            if lib == 'python-docx':
-                missing_libs.append('python-docx')
-            else:
-                missing_libs.append(lib)
+    只用 find_spec 查询加载器是否存在，不真正import——
+    启动时不必为一次存在性检查付出加载模块的代价。
+    """
+    # 包名 -> import名（python-docx 的import名是docx）
+    required_libs = {'nltk': 'nltk', 'python-docx': 'docx'}
+    missing_libs = [lib for lib, module in required_libs.items()
+                    if importlib.util.find_spec(module) is None]
 
     if missing_libs:
         print(f"\n警告: 未安装以下库: {', '.join(missing_libs)}")
@@ -64,6 +60,6 @@ def format_time(seconds):
 def get_file_size(file_path):
     """获取文件大小（MB）"""
     try:
-        return os.path.getsize(file_path) / (1024 * 1024)
-    except:
-        return 0
\ No newline at end of file
+        return os.stat(file_path).st_size / _MB
+    except OSError:
+        return 0.0
\ No newline at end of file